@@ -16,18 +16,36 @@ like those I experience living in Syria.
 By making everything local, I aim to eventually build my own models and services
 that I can host and share with others for free or even through Telegram bots.
 
-Built using: Tkinter, Vosk, pyaudio, ffmpeg, language_tool_python
+Built using: Tkinter, Vosk, pyaudio, webrtcvad, ffmpeg, language_tool_python
 """
 
 import tkinter as tk
 from tkinter import filedialog, messagebox
 import os
 import threading
+import asyncio
+import concurrent.futures
+import queue
 import subprocess
-import json
+import hashlib
+import re
+import wave
+from urllib.parse import urljoin
 import pyaudio
+import webrtcvad
 from vosk import Model, KaldiRecognizer
 import language_tool_python
+import aiohttp
+import orjson
+
+LANGUAGE = 'en-US'  # Supports multiple languages
+CHECK_TIMEOUT = 60  # seconds a single grammar check may take
+CHECK_THREADS = 4  # LanguageTool server threads, also the most requests we send at once
+
+#Where a sentence ends, used to split long texts for the grammar checker
+SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+#Texts this long are checked in pieces of at most this many characters
+CHECK_SPLIT_LENGTH = 500
 
 
 class VoiceToTextApp:
@@ -40,23 +58,138 @@ class VoiceToTextApp:
         self.root.resizable(False, False)
 
         #Speech recognition INPUT setup
-        model_path = "vosk-model-small-en-us-0.15"
-        if not os.path.exists(model_path):
-            raise FileNotFoundError(f"Model '{model_path}' not found. Please download it.")
-        self.model = Model(model_path)
-        self.recognizer = KaldiRecognizer(self.model, 16000)  # The sample rate must match model.
-
-        #Grammar checker setup
-        self.tool = language_tool_python.LanguageTool('en-US')  # Supports multiple languages
+        self.model_path = "vosk-model-small-en-us-0.15"
+        if not os.path.exists(self.model_path):
+            raise FileNotFoundError(f"Model '{self.model_path}' not found. Please download it.")
+
+        #Voice activity detection, so silence never reaches the recognizer
+        self.vad = webrtcvad.Vad(2)  # 0 = least aggressive, 3 = most
+        self.vad_hangover = 0  # bytes still let through after the last voiced frame
+        self.vad_leftover = b''  # tail of the last chunk that didn't fill a whole VAD frame
+
+        #The model and grammar checker are loaded in the background (see warmup),
+        #so the window shows up right away instead of freezing for a few seconds
+        self.model = None
+        self.recognizer = None
+        self.tool = None
+        self.is_ready = False
+
+        #Grammar checks talk to the LanguageTool server directly over aiohttp,
+        #from an asyncio loop on its own thread, so several checks can be in flight at once
+        self.check_loop = None
+        self.check_session = None
+        self.check_url = None
 
         #Resetting recording state
-        self.is_recording = False
-        self.audio_data = b''  # Binary data from microphone
+        #Set while nothing is being recorded, the stop handler sets it to end the record loop
+        self.stop_event = threading.Event()
+        self.stop_event.set()
+        #Set once the app is closing, long running work checks it and stops early
+        #(the pool threads are joined at exit, so they must not keep going)
+        self.quit_event = threading.Event()
+
+        #Microphone, opened once in warmup and only paused between recordings
+        self.audio_queue = queue.Queue()
+        self.pa = None
+        self.stream = None
+        self.session_future = None  # running recording or file load, they share the recognizer
+
+        #Grammar results computed while typing, keyed by a hash of the text
+        self.check_cache = {}
+        self.pending_check = None  # after() id of the next background check
+
+        #Two long lived workers, roughly one for audio and one for LanguageTool,
+        #instead of starting a new thread on every click
+        self.pool = concurrent.futures.ThreadPoolExecutor(max_workers=2, thread_name_prefix="vttg")
+        self.root.protocol("WM_DELETE_WINDOW", self.on_quit)
 
         #Initiate UI elements
         self.create_widgets()
-
-
+        self.set_ready(False)
+        self.run_in_thread(self.warmup, self.on_warmup_done)
+
+    def warmup(self):
+        #Loading takes a while, and the very first call on each tool is slow too,
+        #so I do a dummy run here and the first real recording/submit is already warm
+        try:
+            model = Model(self.model_path)
+            recognizer = KaldiRecognizer(model, 16000)  # The sample rate must match model.
+            recognizer.AcceptWaveform(b'\x00' * 3200)  # 100 ms of silence
+            recognizer.Reset()
+            if self.quit_event.is_set():
+                return None
+
+            #Grammar checker setup
+            #Server side caching + more check threads, so repeated texts come back fast
+            tool = language_tool_python.LanguageTool(LANGUAGE, config={
+                'maxCheckThreads': CHECK_THREADS,
+                'cacheSize': 2048,
+                'pipelineCaching': True,
+                'pipelinePrewarming': True,
+            })
+            if self.quit_event.is_set():
+                tool.close()
+                return None
+            self.start_check_loop(tool)
+            if self.quit_event.is_set():
+                #on_quit may have run before the session existed, so nothing closed it yet.
+                #Not waiting on it: if on_quit closed it after all, the loop is already stopped
+                asyncio.run_coroutine_threadsafe(self.close_check_loop(), self.check_loop)
+                tool.close()
+                return None
+            self.check_text("hello")
+
+            if not self.quit_event.is_set():
+                try:
+                    self.open_microphone()
+                except OSError:
+                    self.stream = None  # no input device, recording will say so
+        except Exception as e:
+            return f"Error: {e}"
+
+        self.model, self.recognizer, self.tool = model, recognizer, tool
+        return None
+
+    def start_check_loop(self, tool):
+        #language_tool_python already started the local server, I just reuse its address
+        self.check_url = urljoin(tool._url, 'check')
+        self.check_loop = asyncio.new_event_loop()
+        threading.Thread(target=self.check_loop.run_forever, daemon=True).start()
+        self.check_session = asyncio.run_coroutine_threadsafe(self.open_check_session(), self.check_loop).result()
+
+    async def open_check_session(self):
+        #Keeps connections to the server alive between checks. The limit makes extra sentences
+        #of a long text wait for a free connection instead of piling up on the server
+        return aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=CHECK_THREADS))
+
+    def open_microphone(self):
+        #Opening the device can take hundreds of ms, so it's done once instead of on every press
+        self.pa = pyaudio.PyAudio()
+        self.stream = self.pa.open(format=pyaudio.paInt16,
+                                   channels=1,
+                                   rate=16000,
+                                   input=True,
+                                   frames_per_buffer=4000,  # 250 ms per chunk
+                                   stream_callback=self.on_audio,
+                                   start=False)
+
+    def on_audio(self, in_data, frame_count, time_info, status):
+        #PortAudio fills the queue from its own thread, so a slow AcceptWaveform can't make us drop audio
+        self.audio_queue.put_nowait(in_data)
+        return (None, pyaudio.paContinue)
+
+    def on_warmup_done(self, error):
+        if error:
+            messagebox.showerror("Error", error)
+        else:
+            self.set_ready(True)
+
+    def set_ready(self, ready):
+        #Recording, loading and submitting all need the model/tool, keep them off until loaded
+        self.is_ready = ready
+        state = 'normal' if ready else 'disabled'
+        for widget in (self.record_label, self.load_btn, self.submit_btn):
+            widget.config(state=state)
 
     def create_widgets(self):
 
@@ -86,6 +219,7 @@ class VoiceToTextApp:
         #Input TextBox
         self.text_box = tk.Text(self.root, height=10, wrap='word', font=("Arial", 12), state='normal')
         self.text_box.pack(padx=10, pady=5, fill='both', expand=True)
+        self.text_box.bind("<<Modified>>", self.on_text_modified)
 
         #Line - Separator 
         sep = tk.Frame(self.root, height=2, bd=1, relief='sunken')
@@ -104,7 +238,7 @@ class VoiceToTextApp:
         self.reset_btn.pack(side=tk.LEFT, padx=5)
 
         #exit button
-        self.exit_btn = tk.Button(bottom_frame, text="Exit", width=10, command=self.root.quit)
+        self.exit_btn = tk.Button(bottom_frame, text="Exit", width=10, command=self.on_quit)
         self.exit_btn.pack(side=tk.LEFT, padx=5)
 
     def reset_app(self):
@@ -118,14 +252,31 @@ class VoiceToTextApp:
 
     def run_in_thread(self, func, callback=None):
         #let's stop the app from freezing whenever I call the model or process something
-        def worker():
-            result = func()
+        def deliver(future):
+            result = future.result()  # errors from the worker get raised here, so Tk reports them
             if callback:
-                self.root.after(0, lambda: callback(result))
-
-        threading.Thread(target=worker, daemon=True).start()
+                callback(result)
+
+        future = self.pool.submit(func)
+        future.add_done_callback(lambda f: self.root.after(0, lambda: deliver(f)))
+        return future
+
+    def on_quit(self):
+        self.quit_event.set()
+        self.stop_event.set()  # lets a running recording finish
+        self.pool.shutdown(wait=False, cancel_futures=True)
+        if self.check_session is not None:  # None while warmup hasn't finished setting it up
+            asyncio.run_coroutine_threadsafe(self.close_check_loop(), self.check_loop)
+        if self.stream is not None:
+            self.stream.close()
+        if self.pa is not None:
+            self.pa.terminate()
+        self.root.quit()
 
     def load_audio_file(self):
+        if self.is_transcribing():
+            return  # the button is disabled meanwhile, this is just a safety net
+
         #Handle multi types of audio files
         file_path = filedialog.askopenfilename(
             title="Select Audio File",
@@ -139,24 +290,30 @@ class VoiceToTextApp:
         self.text_box.insert(tk.END, "Processing audio file...")
 
         def task():
+            #Start from a clean recognizer, nothing left over from the previous recording/file
+            self.recognizer.Reset()
             try:
                 file_ext = os.path.splitext(file_path)[1].lower()
-                if file_ext != ".wav":
-                    # Using ffmpeg to convert unsupported formats to WAV for Vosk
-                    process = subprocess.run([
-                        "ffmpeg", "-i", file_path,
-                        "-ar", "16000", "-ac", "1", "-f", "wav", "pipe:1"
-                    ], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
-                    data = process.stdout
-                else:
-                    with open(file_path, 'rb') as f:
-                        data = f.read()
-
-                if self.recognizer.AcceptWaveform(data):
-                    result = json.loads(self.recognizer.Result())
-                    text = result.get("text", "")
-                else:
-                    text = ""
+                if file_ext == ".wav" and (wav := self.open_native_wav(file_path)) is not None:
+                    with wav:
+                        #Already in the model's format, stream the samples of the data chunk only
+                        #(4000 frames = 8000 bytes), so trailing LIST/id3 chunks never reach Vosk
+                        return self.transcribe_stream(lambda: wav.readframes(4000))
+
+                # Using ffmpeg to convert everything else to raw PCM for Vosk
+                #Reading the pipe while ffmpeg is still decoding, so both run at the same time
+                #-vn/-sn/-dn: ignore cover art, subtitles and data streams, -threads 0: decode on all cores
+                with subprocess.Popen([
+                    "ffmpeg", "-nostdin", "-loglevel", "error", "-threads", "0", "-i", file_path,
+                    "-vn", "-sn", "-dn",
+                    "-ar", "16000", "-ac", "1", "-f", "s16le", "-acodec", "pcm_s16le", "pipe:1"
+                ], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, bufsize=1 << 20) as process:
+                    text = self.transcribe_stream(lambda: process.stdout.read(8000))
+                    if self.quit_event.is_set():
+                        process.kill()  # don't let closing the pipe wait for ffmpeg to finish the file
+                        return text
+                if process.returncode != 0:
+                    raise RuntimeError("ffmpeg could not decode the file.")
                 return text
             except Exception as e:
                 return f"Error: {e}"
@@ -165,49 +322,140 @@ class VoiceToTextApp:
             if text.startswith("Error:"):
                 messagebox.showerror("Error", text)
             else:
-                self.text_box.delete(1.0, tk.END)
-                self.text_box.insert(tk.END, text)
-
-        self.run_in_thread(task, on_complete)
+                self.show_transcript(text)
+
+        self.start_session(task, on_complete)
+
+    def is_transcribing(self):
+        return self.session_future is not None and not self.session_future.done()
+
+    def start_session(self, func, callback=None):
+        #One recording or file load at a time: KaldiRecognizer isn't thread safe and a new session
+        #Reset()s it, so Load stays disabled (and record presses are ignored) until this one is done
+        self.load_btn.config(state='disabled')
+        self.session_future = self.run_in_thread(func, callback)
+        self.session_future.add_done_callback(
+            lambda f: self.root.after(0, lambda: self.load_btn.config(state='normal')))
+
+    def open_native_wav(self, file_path):
+        #Only 16 kHz mono 16-bit files can go to Vosk as they are, the rest need ffmpeg.
+        #Returns the opened wave reader for those, None otherwise
+        try:
+            wav = wave.open(file_path, 'rb')
+        except (wave.Error, EOFError):
+            return None
+        if (wav.getnchannels(), wav.getsampwidth(), wav.getframerate()) != (1, 2, 16000):
+            wav.close()
+            return None
+        return wav
+
+    def transcribe_stream(self, read_chunk):
+        #Feed the audio to the recognizer chunk by chunk instead of loading it all in memory,
+        #read_chunk returns the next piece of raw PCM, or b'' at the end
+        segments = []
+        self.reset_vad()
+        while not self.quit_event.is_set() and (chunk := read_chunk()):
+            if self.accept_audio(chunk):
+                segments.append(orjson.loads(self.recognizer.Result()).get("text", ""))
+        if self.quit_event.is_set():
+            return ""  # app is closing, nobody will see the result
+
+        segments.append(orjson.loads(self.recognizer.FinalResult()).get("text", ""))
+        return " ".join(segment for segment in segments if segment)
+
+    def accept_audio(self, data):
+        #Same as AcceptWaveform, but silent chunks are skipped instead of decoded
+        if self.is_voiced(data):
+            return self.recognizer.AcceptWaveform(data)
+        return False
+
+    def is_voiced(self, data):
+        #webrtcvad works on 30 ms frames: 480 samples at 16 kHz = 960 bytes.
+        #Bytes that don't fill a whole frame are carried over to the next chunk instead of skipped
+        frame = 960
+        buffered = self.vad_leftover + data
+        usable = len(buffered) - len(buffered) % frame
+        self.vad_leftover = buffered[usable:]
+        if any(self.vad.is_speech(buffered[i:i + frame], 16000) for i in range(0, usable, frame)):
+            self.vad_hangover = 9600  # keep up to 300 ms after speech so trailing sounds aren't cut
+            return True
+        #Silent chunks only get through while the hangover still covers all of them
+        if self.vad_hangover >= len(data):
+            self.vad_hangover -= len(data)
+            return True
+        return False
+
+    def reset_vad(self):
+        self.vad_hangover = 0
+        self.vad_leftover = b''
 
     def start_walkie_talkie_recording(self, event=None):
-        self.is_recording = True
+        if not self.is_ready:
+            return  # still loading, the label doesn't block clicks by itself
+        if self.stream is None:
+            messagebox.showerror("Error", "No microphone found.")
+            return
+        if self.is_transcribing():
+            return  # previous recording or file load still running, it shares the recognizer and queue
+
+        #Nothing from an earlier session should end up in this one
+        while True:
+            try:
+                self.audio_queue.get_nowait()
+            except queue.Empty:
+                break
+
+        self.stop_event.clear()
+        self.stream.start_stream()
         self.record_label.config(relief='sunken', bg='red')
         self.reset_app()
         self.text_box.insert(tk.END, "Recording... Speak now.")
-        threading.Thread(target=self.record_microphone).start()
+        self.start_session(self.record_microphone)
 
     def stop_walkie_talkie_recording(self, event=None):
-        self.is_recording = False
+        if self.stream is not None and self.stream.is_active():
+            self.stream.stop_stream()  # returns after the last callback, so all audio is queued by now
+        self.stop_event.set()
         self.record_label.config(relief='raised', bg='lightgray')
 
     def record_microphone(self):
-        p = pyaudio.PyAudio()
-        stream = p.open(format=pyaudio.paInt16,
-                        channels=1,
-                        rate=16000,
-                        input=True,
-                        frames_per_buffer=4096)
+        #Start from a clean recognizer, nothing left over from the previous recording/file
+        self.recognizer.Reset()
+        self.reset_vad()
 
-        stream.start_stream()
+        #Chunks go straight into the recognizer, no need to keep the raw audio around
+        segments = []
 
-        self.audio_data = b''
+        def feed(data):
+            if self.accept_audio(data):
+                #Vosk finished a segment, show it now instead of waiting for the button release
+                segments.append(orjson.loads(self.recognizer.Result()).get("text", ""))
+                partial = " ".join(segment for segment in segments if segment)
+                self.root.after(0, lambda: self.show_transcript(partial))
 
-        while self.is_recording:
-            data = stream.read(4096)
-            self.audio_data += data
-            if self.recognizer.AcceptWaveform(data):
-                pass  # Ignore partial results
+        while not self.stop_event.is_set():
+            try:
+                feed(self.audio_queue.get(timeout=0.1))
+            except queue.Empty:
+                continue
 
-        stream.stop_stream()
-        stream.close()
-        p.terminate()
+        #The stop handler only sets the event after the stream stopped, so whatever is queued now
+        #is the tail of the recording. Drain it, otherwise a quick press/release or the last word gets lost
+        while True:
+            try:
+                feed(self.audio_queue.get_nowait())
+            except queue.Empty:
+                break
 
         #to get final result after recording stops
-        final_result = json.loads(self.recognizer.FinalResult())
-        text = final_result.get("text", "")
+        segments.append(orjson.loads(self.recognizer.FinalResult()).get("text", ""))
+        text = " ".join(segment for segment in segments if segment)
 
         #To display the recognized text
+        #This runs on the recording thread and Tk widgets aren't thread safe, so hand it to the main loop
+        self.root.after(0, lambda: self.show_transcript(text))
+
+    def show_transcript(self, text):
         self.text_box.delete(1.0, tk.END)
         self.text_box.insert(tk.END, text)
 
@@ -220,14 +468,32 @@ class VoiceToTextApp:
         self.placeholder_box.delete(1.0, tk.END)
         self.placeholder_box.insert(tk.END, "Checking grammar...")
 
+        #A background check that hasn't started yet would just send the same text again
+        if self.pending_check is not None:
+            self.root.after_cancel(self.pending_check)
+            self.pending_check = None
+
+        #If the text didn't change since the last background check, the result is already here
+        key = self.text_key(raw_text)
+        cached = self.check_cache.get(key)
+
         def task():
-            matches = self.tool.check(raw_text)
-            corrected = self.tool.correct(raw_text) if matches else None
+            try:
+                matches = cached if cached is not None else self.check_text(raw_text)
+            except Exception as e:
+                #Server errors, timeouts, or the check being cancelled because the app is closing
+                return f"Error: {str(e) or type(e).__name__}"
+            #tool.correct() would run the whole check again, so reuse the matches we already have
+            corrected = language_tool_python.utils.correct(raw_text, matches) if matches else None
             return matches, corrected, raw_text
 
         def on_complete(result):
-            matches, corrected, _ = result
             self.placeholder_box.delete(1.0, tk.END)
+            if isinstance(result, str):
+                messagebox.showerror("Error", result)
+                return
+            matches, corrected, _ = result
+            self.cache_matches(key, matches)
             if not matches:
                 self.placeholder_box.insert(tk.END, "CORRECT")
             else:
@@ -235,6 +501,101 @@ class VoiceToTextApp:
 
         self.run_in_thread(task, on_complete)
 
+    def check_text(self, text):
+        #Blocking wrapper for worker threads, the actual requests run on the asyncio loop
+        #The timeout is a safety net, a worker must never wait forever on a loop that was stopped at exit
+        future = asyncio.run_coroutine_threadsafe(self.check_async(text), self.check_loop)
+        return future.result(timeout=CHECK_TIMEOUT)
+
+    async def close_check_loop(self):
+        #Cancel checks still in flight first, so the worker threads waiting on them are released
+        #and the app can exit (the pool threads are joined at exit)
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self.check_session.close()
+        asyncio.get_running_loop().stop()
+
+    async def check_async(self, text):
+        #Long texts are checked one piece (sentence or less) per request, all in flight at once,
+        #since the server has the threads for it
+        starts = self.split_for_check(text) if len(text) >= CHECK_SPLIT_LENGTH else [0]
+        ends = starts[1:] + [len(text)]
+
+        results = await asyncio.gather(*(self.post_check(text[start:end]) for start, end in zip(starts, ends)))
+        matches = []
+        for start, found in zip(starts, results):
+            #Offsets are relative to the sentence, move them back into the full text.
+            #The server counts in UTF-16 units (emoji count as 2), so the shift has to as well
+            shift = len(text[:start].encode('utf-16-le')) // 2
+            for attrib in found:
+                attrib['offset'] += shift
+                matches.append(language_tool_python.Match(attrib, text))
+        return matches
+
+    def split_for_check(self, text):
+        #Start offsets of the pieces a long text is checked in. Sentence ends first, but transcripts
+        #have no punctuation, so anything still longer than CHECK_SPLIT_LENGTH is cut at a space
+        sentence_starts = [0] + [m.end() for m in SENTENCE_END.finditer(text)]
+        sentence_ends = sentence_starts[1:] + [len(text)]
+        starts = []
+        for start, end in zip(sentence_starts, sentence_ends):
+            while end - start > CHECK_SPLIT_LENGTH:
+                starts.append(start)
+                cut = text.rfind(' ', start + 1, start + CHECK_SPLIT_LENGTH)
+                start = cut + 1 if cut != -1 else start + CHECK_SPLIT_LENGTH  # no space at all, cut anyway
+            starts.append(start)
+        return starts
+
+    async def post_check(self, text):
+        async with self.check_session.post(self.check_url, data={'language': LANGUAGE, 'text': text}) as response:
+            response.raise_for_status()
+            #Responses for long texts get big, orjson parses them a lot faster than json
+            return orjson.loads(await response.read())['matches']
+
+    def on_text_modified(self, event=None):
+        #Clearing the flag fires <<Modified>> again, skip that one
+        if not self.text_box.edit_modified():
+            return
+        self.text_box.edit_modified(False)  # Tk only sends the event again once the flag is cleared
+
+        #Debounce: check 400 ms after the last change, so Submit is usually instant
+        if self.pending_check is not None:
+            self.root.after_cancel(self.pending_check)
+        self.pending_check = self.root.after(400, self.background_check)
+
+    def background_check(self):
+        self.pending_check = None
+        text = self.text_box.get(1.0, tk.END).strip()
+        #Skip while recording or loading, the box only holds a placeholder or a partial transcript then
+        if not self.is_ready or self.is_transcribing() or not text:
+            return
+
+        key = self.text_key(text)
+        if key in self.check_cache:
+            return
+
+        def on_complete(matches):
+            if matches is not None:
+                self.cache_matches(key, matches)
+
+        def task():
+            try:
+                return self.check_text(text)
+            except Exception:
+                return None  # only a head start for Submit, which reports errors itself
+
+        self.run_in_thread(task, on_complete)
+
+    def cache_matches(self, key, matches):
+        if len(self.check_cache) >= 32:
+            self.check_cache.clear()  # every edit adds a key, don't let it grow forever
+        self.check_cache[key] = matches
+
+    def text_key(self, text):
+        return hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+
 
 #Main App/Loop
 if __name__ == "__main__":